@@ -3,7 +3,6 @@
 Interactive setup script for PollEV Automation.
 Helps configure API keys, iMessage settings, and Class schedules.
 """
-import json
 import sys
 from pathlib import Path
 from typing import Any
@@ -12,9 +11,13 @@ from typing import Any
 BASE_DIR = Path(__file__).parent.resolve()
 DATA_DIR = BASE_DIR / "data"
 
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+from _json import JSONDecodeError, dumps, loads
+from utils import load_classes, save_classes
+
 API_KEY_FILE = DATA_DIR / "API_KEY_GEMINI"
 IMESSAGE_FILE = DATA_DIR / "imessage_config.json"
-CLASSES_FILE = DATA_DIR / "classes.json"
 
 
 def input_with_default(prompt_text: str, current_value: Any = "") -> str:
@@ -59,8 +62,8 @@ def setup_imessage():
     config = {}
     if IMESSAGE_FILE.exists():
         try:
-            config = json.loads(IMESSAGE_FILE.read_text())
-        except json.JSONDecodeError:
+            config = loads(IMESSAGE_FILE.read_bytes())
+        except JSONDecodeError:
             pass
             
     # Allow empty/partial config
@@ -70,7 +73,7 @@ def setup_imessage():
     
     if new_recipient:
         config["recipient_address"] = new_recipient
-        IMESSAGE_FILE.write_text(json.dumps(config, indent=2))
+        IMESSAGE_FILE.write_bytes(dumps(config, indent=True))
         print("✓ iMessage config updated.")
     else:
         print("✓ No changes to iMessage config.")
@@ -79,14 +82,14 @@ def setup_imessage():
 def setup_classes():
     print("\n--- Class Configuration ---")
     classes = {}
-    if CLASSES_FILE.exists():
-        try:
-            classes = json.loads(CLASSES_FILE.read_text())
-        except json.JSONDecodeError:
-            pass
+    try:
+        classes = load_classes()
+    except (FileNotFoundError, JSONDecodeError):
+        pass
             
     print(f"Current classes: {', '.join(classes.keys()) if classes else 'None'}")
     
+    updates = {}
     while True:
         mode = input("\nDo you want to (E)dit/Add a class, or (F)inish? [F]: ").strip().lower()
         if mode != 'e':
@@ -121,7 +124,7 @@ def setup_classes():
         end = input_with_default("  End Time (HH:MM:SS)", current_info.get("end_time", ""))
         
         # Save to dict
-        classes[class_name] = {
+        classes[class_name] = updates[class_name] = {
             "section": section,
             "latitude": lat,
             "longitude": lon,
@@ -129,9 +132,12 @@ def setup_classes():
             "end_time": end
         }
         
-        # Write immediately
-        CLASSES_FILE.write_text(json.dumps(classes, indent=2))
-        print(f"✓ Saved '{class_name}' to classes.json")
+        print(f"✓ Updated '{class_name}'")
+    
+    # Append only the edited classes, once, on finish
+    if updates:
+        save_classes(updates)
+        print("✓ Saved classes to classes.jsonl")
 
 
 import subprocess
@@ -3,9 +3,7 @@
 Launcher script for PollEV skipping automation.
 Checks if login is valid, then starts the monitor.
 """
-import os
 import sys
-import subprocess
 from pathlib import Path
 
 # Constants matching config.py logic
@@ -14,6 +12,12 @@ DATA_DIR = BASE_DIR / "data"
 SESSION_STATE_DIR = DATA_DIR / "session_state"
 SESSION_FILE = SESSION_STATE_DIR / "state.json"
 
+# Run login/monitor in-process rather than paying for a second interpreter
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+import login
+import monitor
+
 def main():
     print("🚀 PollEV Automation Launcher")
     print("=" * 30)
@@ -22,8 +26,8 @@ def main():
     if not SESSION_FILE.exists():
         print("⚠️  No session found. Starting login flow...")
         try:
-            subprocess.run([sys.executable, "src/login.py"], check=True)
-        except subprocess.CalledProcessError:
+            login.main()
+        except (Exception, KeyboardInterrupt):
             print("❌ Login failed or cancelled.")
             sys.exit(1)
             
@@ -37,13 +41,12 @@ def main():
     # Run monitor
     print("👁️  Starting monitor...")
     try:
-        # Pass through any arguments (like -test) to the monitor
-        args = [sys.executable, "src/monitor.py"] + sys.argv[1:]
-        subprocess.run(args, check=True)
+        # Arguments (like -test) are read from the shared sys.argv
+        monitor.run()
     except KeyboardInterrupt:
         pass
-    except subprocess.CalledProcessError:
-        print("❌ Monitor exited with error.")
+    except Exception as e:
+        print(f"❌ Monitor exited with error: {e}")
 
 if __name__ == "__main__":
     main()
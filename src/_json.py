@@ -0,0 +1,30 @@
+"""
+JSON helpers shared by config readers/writers and the Gemma response parser.
+
+Uses orjson when installed, falling back to the stdlib json module otherwise
+(e.g. when init.py runs before setup.sh has installed dependencies).
+"""
+from json import JSONDecodeError
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+__all__ = ["JSONDecodeError", "loads", "dumps"]
+
+
+def loads(data: bytes | str) -> Any:
+    """Parse JSON from bytes or str. Raises JSONDecodeError on malformed input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes, optionally indented by 2 spaces."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode("utf-8")
@@ -0,0 +1,95 @@
+"""
+Persistent AppleScript interpreter shared by iMessage sends and notifications.
+
+Keeps one `osascript -i` process alive and feeds it one-line statements over
+stdin instead of spawning a fresh osascript (and AppleScript runtime) per call.
+"""
+import atexit
+import os
+import select
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# The sentinel is built by concatenation so the echoed statement itself never
+# contains it -- only the evaluated result does.
+_SENTINEL = b"__OSA_END__"
+_SENTINEL_STATEMENT = '"__OSA" & "_END__"'
+
+# AppleScript string literal escapes (newlines must not break the one-line statement)
+_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r"})
+
+_PROC: subprocess.Popen | None = None
+_LOCK = threading.Lock()
+
+# Single worker so fire-and-forget statements run in order behind the shared interpreter
+_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="osascript")
+
+
+def quote(text: str) -> str:
+    """Return text as a one-line AppleScript string literal."""
+    return '"' + text.translate(_ESCAPES) + '"'
+
+
+def _get_proc() -> subprocess.Popen:
+    """Start the interpreter on first use, or restart it if it exited."""
+    global _PROC
+    if _PROC is None or _PROC.poll() is not None:
+        _PROC = subprocess.Popen(
+            ["osascript", "-i"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+        )
+    return _PROC
+
+
+def _terminate() -> None:
+    """Stop the interpreter (also called after a timeout to drop stale output)."""
+    global _PROC
+    if _PROC is not None and _PROC.poll() is None:
+        _PROC.terminate()
+    _PROC = None
+
+
+atexit.register(_terminate)
+
+
+def run_osa(script: str, timeout: float = 10) -> str:
+    """
+    Run a one-line AppleScript statement and return the interpreter output.
+
+    Raises:
+        TimeoutError: if the statement did not finish within timeout seconds
+        RuntimeError: if the interpreter exited or reported an error
+    """
+    with _LOCK:
+        proc = _get_proc()
+        proc.stdin.write(f"{script}\n{_SENTINEL_STATEMENT}\n".encode())
+        proc.stdin.flush()
+
+        fd = proc.stdout.fileno()
+        output = b""
+        deadline = time.monotonic() + timeout
+        while _SENTINEL not in output:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                _terminate()
+                raise TimeoutError(f"osascript did not respond within {timeout}s")
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                _terminate()
+                raise RuntimeError("osascript exited unexpectedly")
+            output += chunk
+
+    text = output.split(_SENTINEL, 1)[0].decode(errors="replace")
+    if "execution error:" in text or "syntax error:" in text:
+        raise RuntimeError(text.strip())
+    return text
+
+
+def submit_osa(script: str) -> Future:
+    """Queue a statement for run_osa without waiting; errors stay on the returned Future."""
+    return _EXECUTOR.submit(run_osa, script)
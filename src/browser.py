@@ -2,13 +2,14 @@
 Browser automation and interaction logic.
 Handles browser creation, location spoofing, content extraction, and interaction.
 """
-from bs4 import BeautifulSoup
-from playwright.sync_api import Page, Playwright, Browser, BrowserContext
+import asyncio
+
+from playwright.async_api import Page
 
 from config import SESSION_STATE_DIR
 
-def create_geolocation_context(playwright: Playwright, class_info: dict) -> tuple[Browser, BrowserContext]:
-    """Create a browser context with spoofed geolocation."""
+def geolocation_context_kwargs(class_info: dict) -> dict:
+    """Build browser.new_context() kwargs for a session with spoofed geolocation."""
     storage_path = SESSION_STATE_DIR / "state.json"
     
     if not storage_path.exists():
@@ -17,8 +18,6 @@ def create_geolocation_context(playwright: Playwright, class_info: dict) -> tupl
             "Please run login.py first to save your session."
         )
     
-    browser = playwright.chromium.launch(headless=False)
-    
     lat = class_info.get("latitude", 0)
     lon = class_info.get("longitude", 0)
     
@@ -26,61 +25,150 @@ def create_geolocation_context(playwright: Playwright, class_info: dict) -> tupl
     if lon > 0 and lat < 0:
         lat, lon = lon, lat
     
-    context = browser.new_context(
-        storage_state=str(storage_path),
-        geolocation={"latitude": lat, "longitude": lon},
-        permissions=["geolocation"],
-    )
-    
-    return browser, context
+    return {
+        "storage_state": str(storage_path),
+        "geolocation": {"latitude": lat, "longitude": lon},
+        "permissions": ["geolocation"],
+    }
 
 
-def get_page_content_hash(page: Page) -> str:
-    """Get a hash of the main content area to detect changes."""
-    try:
-        content = page.evaluate("""
-            () => {
-                const main = document.querySelector('main') || 
-                             document.querySelector('[role="main"]') ||
-                             document.querySelector('.content') ||
-                             document.body;
-                return main ? main.innerText : '';
+# Fonts and audio/video are never needed to read or answer a poll; images stay
+# visible because a question can be an image. Blocked through CDP rather than
+# page.route(), which would disable the HTTP cache for the whole context.
+BLOCKED_URL_PATTERNS = [
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*",
+    "*.mp3*", "*.mp4*", "*.webm*", "*.ogg*", "*.m4a*",
+]
+
+
+# Page-side helpers, installed once per document by install_page_helpers so V8 parses
+# them once and each call below only ships a one-line stub. The MutationObserver pushes
+# a "something changed" signal to Python via the exposed binding; at most one call is
+# in flight, and mutations that land meanwhile collapse into a single follow-up.
+_PAGE_HELPERS_JS = r"""
+(() => {
+    const TITLE = '.component-response-header__title';
+    const VALUE = '.component-response-multiple-choice__option__value';
+    const VOTE = '.component-response-multiple-choice__option__vote';
+    const UNDO = '.component-response-multiple-choice__option__undo';
+
+    // 64-bit FNV-1a over the title and every option (the question container only)
+    const fnv1a = (s) => {
+        let h = 0xcbf29ce484222325n;
+        for (let i = 0; i < s.length; i++) {
+            h ^= BigInt(s.charCodeAt(i));
+            h = (h * 0x100000001b3n) & 0xffffffffffffffffn;
+        }
+        return h.toString(16).padStart(16, '0');
+    };
+    const read = () => {
+        const title = document.querySelector(TITLE);
+        const options = Array.from(document.querySelectorAll(VALUE), o => o.innerText.trim());
+        return [title ? title.innerText.trim() : '', options];
+    };
+    const fingerprint = (question, options) => fnv1a(question + '|' + options.join('\x1f'));
+
+    window.__pollev = {
+        // Compared in-page: unchanged ticks only ship the digest back
+        snapshot(prev) {
+            const [question, options] = read();
+            const fp = fingerprint(question, options);
+            if (fp === prev || !question || !options.length) return [fp, null];
+            return [fp, [question, options]];
+        },
+        click(n) {
+            const buttons = document.querySelectorAll(VOTE);
+            if (n < 1 || n > buttons.length) return false;
+            buttons[n - 1].click();
+            return true;
+        },
+        // Clear ALL visible selections (safe for multi-select too)
+        unclick() {
+            let n = 0;
+            for (const btn of document.querySelectorAll(UNDO)) {
+                const rect = btn.getBoundingClientRect();
+                if (rect.width > 0 && rect.height > 0) {
+                    btn.click();
+                    n++;
+                }
             }
-        """)
-        return str(hash(content))
+            return n;
+        },
+    };
+
+    let inflight = false, dirty = false;
+    const notify = () => {
+        if (inflight) { dirty = true; return; }
+        inflight = true;
+        window.__pollevChanged().finally(() => {
+            inflight = false;
+            if (dirty) { dirty = false; notify(); }
+        });
+    };
+    new MutationObserver(notify)
+        .observe(document, {childList: true, subtree: true, characterData: true});
+})();
+"""
+
+
+async def install_page_helpers(page: Page) -> asyncio.Event:
+    """
+    Block fonts/media, then install the page helpers and mutation push on every
+    document the page loads (call before goto). The functions below rely on them.
+    
+    Returns:
+        An event that is set whenever the DOM mutates; pass it to wait_for_change.
+    """
+    try:
+        cdp = await page.context.new_cdp_session(page)
+        await cdp.send("Network.enable")
+        await cdp.send("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
     except Exception:
-        return ""
+        pass  # only an optimization; the page works without it
+    
+    changed = asyncio.Event()
+    await page.expose_binding("__pollevChanged", lambda source: changed.set())
+    await page.add_init_script(_PAGE_HELPERS_JS)
+    return changed
 
 
-def extract_from_page(page: Page) -> tuple[str, list[str]] | None:
+async def wait_for_change(changed: asyncio.Event, timeout_ms: float) -> bool:
     """
-    Extract question and options directly from a Playwright page.
+    Sleep until the page reports a DOM mutation.
     
     Returns:
-        Tuple of (question, options) or None if not found
+        True if the page changed, False if timeout_ms elapsed first.
+        The event is cleared so mutations during the caller's handling wake the next wait.
     """
     try:
-        html_content = page.content()
-        soup = BeautifulSoup(html_content, "lxml")
-        
-        # Extract question title
-        title_elem = soup.select_one(".component-response-header__title")
-        if not title_elem:
-            return None
-        question = title_elem.get_text(strip=True)
-        
-        # Extract options
-        option_elems = soup.select(".component-response-multiple-choice__option__value")
-        if not option_elems:
-            return None
-        options = [opt.get_text(strip=True) for opt in option_elems]
-        
-        return question, options
+        await asyncio.wait_for(changed.wait(), timeout_ms / 1000)
+    except asyncio.TimeoutError:
+        return False
+    changed.clear()
+    return True
+
+
+async def snapshot(page: Page, prev_fp: str | None = None) -> tuple[str, tuple[str, list[str]] | None]:
+    """
+    Fingerprint the page and extract the question in a single round-trip.
+    
+    Returns:
+        (fingerprint, (question, options)) when the fingerprint differs from prev_fp
+        and a question is on screen, otherwise (fingerprint, None).
+        The fingerprint is "" if the page could not be read.
+    """
+    try:
+        fp, extracted = await page.evaluate("prev => window.__pollev.snapshot(prev)", prev_fp)
     except Exception:
-        return None
+        return "", None
+    
+    if extracted is None:
+        return fp, None
+    question, options = extracted
+    return fp, (question, options)
 
 
-def click_option(page: Page, option_number: int) -> bool:
+async def click_option(page: Page, option_number: int) -> bool:
     """
     Click the specified option button (1-indexed).
     
@@ -88,33 +176,17 @@ def click_option(page: Page, option_number: int) -> bool:
         True if click succeeded, False otherwise
     """
     try:
-        # Get all vote buttons
-        buttons = page.query_selector_all(".component-response-multiple-choice__option__vote")
-        if option_number < 1 or option_number > len(buttons):
-            return False
-        
-        # Click the button (0-indexed internally)
-        buttons[option_number - 1].click()
-        return True
+        return await page.evaluate("n => window.__pollev.click(n)", option_number)
     except Exception:
         return False
 
 
-def unclick_current_option(page: Page) -> bool:
+async def unclick_current_option(page: Page) -> bool:
     """
     Find and click 'undo' buttons for ANY currently selected options.
     Returns True if at least one undo button was clicked.
     """
     try:
-        undo_buttons = page.query_selector_all(".component-response-multiple-choice__option__undo")
-        clicked_any = False
-        
-        for btn in undo_buttons:
-            if btn.is_visible():
-                btn.click()
-                clicked_any = True
-                # Keep going to clear ALL selections (safe for multi-select too)
-                
-        return clicked_any
+        return await page.evaluate("() => window.__pollev.unclick()") > 0
     except Exception:
         return False
@@ -0,0 +1,149 @@
+"""
+Shared pool of Chromium instances for class sessions.
+
+Holds a fixed number of browsers, each launched on first use (so no window
+opens until a class is active), and hands out a BrowserContext per class session. Contexts are parked when a session ends and reused by the
+next session with the same login state. Instances that crash/disconnect are
+relaunched on next use, and instances that have served too many contexts
+or lived too long are recycled once idle.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from playwright.async_api import Browser, BrowserContext, Playwright
+
+# Chromium flags for long-running poll pages: skip background services PollEV
+# never needs, and keep background windows from being throttled. Media waits for
+# a user gesture, so audio/video never starts downloading on its own.
+LAUNCH_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-background-networking",
+    "--disable-breakpad",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-extensions",
+    "--disable-features=Translate,BackForwardCache",
+    "--disable-renderer-backgrounding",
+    "--autoplay-policy=user-gesture-required",
+]
+
+@dataclass
+class BrowserInstance:
+    """One pooled Chromium process and its usage counters."""
+    browser: Browser | None = None
+    launched_at: float = 0.0
+    contexts_served: int = 0
+    active_contexts: int = 0
+    # Parked contexts by storage_state path, ready for the next session
+    idle_contexts: dict[str, list[BrowserContext]] = field(default_factory=dict)
+
+    @property
+    def healthy(self) -> bool:
+        """False once the process has crashed or disconnected."""
+        return self.browser is not None and self.browser.is_connected()
+
+
+class BrowserPool:
+    """Bounded pool of browsers shared by all class sessions."""
+
+    def __init__(
+        self,
+        playwright: Playwright,
+        size: int = 1,
+        max_contexts: int = 32,
+        max_contexts_per_browser: int = 50,
+        max_age_seconds: float = 6 * 3600,
+        max_idle_contexts: int = 4,
+    ):
+        self._playwright = playwright
+        self._instances = [BrowserInstance() for _ in range(size)]
+        self._semaphore = asyncio.Semaphore(max_contexts)
+        self._lock = asyncio.Lock()
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.max_age_seconds = max_age_seconds
+        self.max_idle_contexts = max_idle_contexts
+
+    async def close(self) -> None:
+        """Close every pooled browser."""
+        async with self._lock:
+            for instance in self._instances:
+                if instance.browser is not None and instance.browser.is_connected():
+                    await instance.browser.close()
+                instance.browser = None
+                instance.idle_contexts.clear()
+
+    @asynccontextmanager
+    async def acquire(self, **context_kwargs) -> AsyncIterator[BrowserContext]:
+        """
+        Yield a context on the least-loaded browser, launching or relaunching it if needed.
+        
+        A parked context with the same storage_state is reused (its geolocation is
+        updated to match); otherwise a new one is created. On exit its pages are
+        closed and the context is parked for the next session, or closed.
+        """
+        key = str(context_kwargs.get("storage_state"))
+        async with self._semaphore:
+            async with self._lock:
+                instance = min(self._instances, key=lambda i: i.active_contexts)
+                if not instance.healthy:
+                    await self._launch(instance)
+                context = await self._reuse(instance, key, context_kwargs)
+                if context is None:
+                    context = await instance.browser.new_context(**context_kwargs)
+                instance.active_contexts += 1
+                instance.contexts_served += 1
+
+            try:
+                yield context
+            finally:
+                await self._release(instance, key, context)
+
+    async def _reuse(self, instance: BrowserInstance, key: str, context_kwargs: dict) -> BrowserContext | None:
+        """Pop a parked context for this login state, or None if there is none usable."""
+        parked = instance.idle_contexts.get(key)
+        while parked:
+            context = parked.pop()
+            try:
+                await context.set_geolocation(context_kwargs.get("geolocation"))
+                return context
+            except Exception:
+                pass  # context died while parked; try the next one
+        return None
+
+    async def _release(self, instance: BrowserInstance, key: str, context: BrowserContext) -> None:
+        """Park the context if there is room (and its browser is staying), else close it."""
+        async with self._lock:
+            instance.active_contexts -= 1
+            recycle = instance.active_contexts == 0 and self._expired(instance)
+            parked = sum(len(contexts) for contexts in instance.idle_contexts.values())
+            try:
+                if recycle or not instance.healthy or parked >= self.max_idle_contexts:
+                    await context.close()
+                else:
+                    for page in context.pages:
+                        await page.close()
+                    instance.idle_contexts.setdefault(key, []).append(context)
+            except Exception:
+                pass  # browser already gone (crash); relaunched on next acquire
+            if recycle:
+                await self._launch(instance)
+
+    def _expired(self, instance: BrowserInstance) -> bool:
+        return (
+            instance.contexts_served >= self.max_contexts_per_browser
+            or time.monotonic() - instance.launched_at >= self.max_age_seconds
+        )
+
+    async def _launch(self, instance: BrowserInstance) -> None:
+        """(Re)launch an instance's browser, closing the old one if still alive."""
+        if instance.browser is not None and instance.browser.is_connected():
+            await instance.browser.close()
+
+        # Parked contexts die with the old browser
+        instance.idle_contexts.clear()
+        instance.browser = await self._playwright.chromium.launch(headless=False, args=LAUNCH_ARGS)
+        instance.launched_at = time.monotonic()
+        instance.contexts_served = 0
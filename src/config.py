@@ -5,7 +5,9 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
 SESSION_STATE_DIR = DATA_DIR / "session_state"
-CLASSES_FILE = DATA_DIR / "classes.json"
+CLASSES_FILE = DATA_DIR / "classes.jsonl"
+LEGACY_CLASSES_FILE = DATA_DIR / "classes.json"
+ANSWER_CACHE_FILE = DATA_DIR / "answer_cache.json"
 
 # URLs
 POLLEV_BASE_URL = "https://pollev.com"
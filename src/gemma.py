@@ -4,11 +4,15 @@ Gemma AI abstraction layer for PollEV answering.
 
 Provides structured responses for multiple choice questions.
 """
-import json
-import re
-import subprocess
+import atexit
+import queue
 import sys
-from dataclasses import dataclass
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import lru_cache
 from enum import Enum
 from pathlib import Path
 from typing import Optional
@@ -16,7 +20,15 @@ from typing import Optional
 sys.path.insert(0, str(Path(__file__).parent))
 
 import google.generativeai as genai
-from config import DATA_DIR
+import regex
+from _json import JSONDecodeError, dumps, loads
+from _osa import quote, submit_osa
+from config import ANSWER_CACHE_FILE, DATA_DIR
+
+MODEL_NAME = "gemma-3-27b-it"
+
+# Outermost balanced {...} object; (?R) recurses so nested braces match.
+_JSON_RE = regex.compile(r"\{(?:[^{}]|(?R))*\}", regex.DOTALL)
 
 
 class AnswerStatus(Enum):
@@ -40,13 +52,12 @@ class AIAnswer:
 
 def send_mac_notification(title: str, message: str, sound: str = "Glass") -> None:
     """Send a macOS notification with sound."""
-    # Escape quotes in message
-    message = message.replace('"', '\\"')
-    title = title.replace('"', '\\"')
-    script = f'display notification "{message}" with title "{title}" sound name "{sound}"'
-    subprocess.run(["osascript", "-e", script], check=False)
+    script = f'display notification {quote(message)} with title {quote(title)} sound name {quote(sound)}'
+    # Best-effort UI feedback: don't hold up the answer click waiting on osascript
+    submit_osa(script)
 
 
+@lru_cache(maxsize=1)
 def _load_api_key() -> str:
     """Load API key from file."""
     api_key_file = DATA_DIR / "API_KEY_GEMINI"
@@ -55,19 +66,25 @@ def _load_api_key() -> str:
     return api_key_file.read_text().strip()
 
 
-def _build_prompt(question: str, options: list[str]) -> str:
-    """Build strictly structured prompt for Gemma with required best answer."""
-    options_list = "\n".join(f"  {i+1}. {opt}" for i, opt in enumerate(options))
-    
-    return f"""You are an AI assistant answering a multiple choice poll question.
+_MODEL: genai.GenerativeModel | None = None
+_MODEL_LOCK = threading.Lock()
 
-QUESTION: {question}
 
-OPTIONS:
-{options_list}
+def _get_model() -> genai.GenerativeModel:
+    """Configure the SDK and build the model once, shared by all class sessions."""
+    global _MODEL
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            genai.configure(api_key=_load_api_key())
+            _MODEL = genai.GenerativeModel(MODEL_NAME)
+        return _MODEL
 
-INSTRUCTIONS:
-Analyze the question and provide a structured JSON response. You MUST ALWAYS provide your best answer (integer 1-{len(options)}), even if the question is subjective or requires outside knowledge.
+
+# Static prompt scaffolding, built once; only the question, options and count vary
+_PROMPT_PREFIX = "You are an AI assistant answering a multiple choice poll question.\n\n"
+
+_INSTRUCTIONS_FMT = """INSTRUCTIONS:
+Analyze {subject} and provide a structured JSON response. You MUST ALWAYS provide your best answer (integer 1-{n}), even if the question is subjective or requires outside knowledge.
 
 CONFIDENCE RULES (STRICT):
 - "high": The question is completely self-contained, objective, and you are >95% sure of the answer.
@@ -75,14 +92,14 @@ CONFIDENCE RULES (STRICT):
 - "low": The question requires external context (e.g. "shown on the board", "this diagram", "previous slide", "what did the speaker say"), OR is highly subjective, OR you are guessing. 
 - IMPORTANT: If a question asks about "the correct node", "this code", or "the image", and no code/image is provided, you MUST set confidence to "low".
 
-RESPONSE FORMAT (respond with ONLY this JSON, no other text):
+RESPONSE FORMAT ({format_note}):
 {{
   "analysis": {{
     "question_type": "factual" | "subjective" | "requires_context",
     "reasoning": "<your step-by-step reasoning>"
   }},
   "answer": {{
-    "best_option": <integer 1-{len(options)}>,
+    "best_option": <integer 1-{n}>,
     "confidence": "high" | "medium" | "low",
     "explanation": "<why this is the best answer>"
   }}
@@ -112,9 +129,23 @@ EXAMPLE for "What is the correct node?" (with no diagram):
     "confidence": "low",
     "explanation": "Guessing Option 1 because context is missing."
   }}
-}}
+}}"""
 
-Now respond with ONLY the JSON for the given question:"""
+_PROMPT_CLOSING = "\n\nNow respond with ONLY the JSON for the given question:"
+
+
+def _build_prompt(question: str, options: list[str]) -> str:
+    """Build strictly structured prompt for Gemma with required best answer."""
+    options_list = "\n".join(["  %d. %s" % (i + 1, opt) for i, opt in enumerate(options)])
+    
+    return "".join((
+        _PROMPT_PREFIX, "QUESTION: ", question,
+        "\n\nOPTIONS:\n", options_list,
+        "\n\n", _INSTRUCTIONS_FMT.format(
+            subject="the question", n=len(options), format_note="respond with ONLY this JSON, no other text",
+        ),
+        _PROMPT_CLOSING,
+    ))
 
 
 def _parse_response(response_text: str, num_options: int) -> AIAnswer:
@@ -123,28 +154,14 @@ def _parse_response(response_text: str, num_options: int) -> AIAnswer:
     
     # Try to extract JSON from response (handle nested braces)
     try:
-        # Find the outermost JSON object
-        start = raw.find('{')
-        if start == -1:
+        match = _JSON_RE.search(raw)
+        if match is None:
             raise ValueError("No JSON found")
-        
-        depth = 0
-        end = start
-        for i, char in enumerate(raw[start:], start):
-            if char == '{':
-                depth += 1
-            elif char == '}':
-                depth -= 1
-                if depth == 0:
-                    end = i + 1
-                    break
-        
-        json_str = raw[start:end]
-        data = json.loads(json_str)
-    except (json.JSONDecodeError, ValueError) as e:
+        data = loads(match.group(0).encode())
+    except (JSONDecodeError, ValueError) as e:
         return AIAnswer(
             status=AnswerStatus.ERROR,
-            reason=f"Could not parse JSON: {e}",
+            reasoning=f"Could not parse JSON: {e}",
             raw_response=raw
         )
     
@@ -196,13 +213,8 @@ def ask_gemma(question: str, options: list[str]) -> AIAnswer:
         AIAnswer with structured response
     """
     try:
-        api_key = _load_api_key()
-        genai.configure(api_key=api_key)
-        
-        model = genai.GenerativeModel("gemma-3-27b-it")
         prompt = _build_prompt(question, options)
-        
-        response = model.generate_content(prompt)
+        response = _get_model().generate_content(prompt)
         return _parse_response(response.text, len(options))
     
     except Exception as e:
@@ -213,6 +225,217 @@ def ask_gemma(question: str, options: list[str]) -> AIAnswer:
         )
 
 
+_BATCH_PREFIX_FMT = "You are an AI assistant answering {count} independent multiple choice poll questions.\n\n"
+
+_BATCH_CLOSING_FMT = """
+
+Respond with ONLY a JSON array of exactly {count} such objects, one per question, in question order:"""
+
+
+def _build_batch_prompt(items: list[tuple[str, list[str]]]) -> str:
+    """Build one prompt for several questions: numbered question blocks, then the instructions once."""
+    parts = [_BATCH_PREFIX_FMT.format(count=len(items))]
+    for i, (question, options) in enumerate(items):
+        options_list = "\n".join(["  %d. %s" % (j + 1, opt) for j, opt in enumerate(options)])
+        parts.append("QUESTION %d: %s\nOPTIONS:\n%s\n\n" % (i + 1, question, options_list))
+    parts.append(_INSTRUCTIONS_FMT.format(
+        subject="each question", n="N",
+        format_note="one object like this per question, where N is that question's number of options",
+    ))
+    parts.append(_BATCH_CLOSING_FMT.format(count=len(items)))
+    return "".join(parts)
+
+
+def _parse_batch_item(response_text: str, num_options: int) -> AIAnswer:
+    """Parse one object of a batched response; a malformed one only fails its own question."""
+    try:
+        return _parse_response(response_text, num_options)
+    except Exception as e:
+        return AIAnswer(
+            status=AnswerStatus.ERROR,
+            reasoning=f"Could not parse answer: {e}",
+            raw_response=response_text
+        )
+
+
+def ask_gemma_batch(items: list[tuple[str, list[str]]]) -> list[AIAnswer] | None:
+    """
+    Answer several questions with a single Gemma request.
+    
+    Args:
+        items: List of (question, options) pairs
+    
+    Returns:
+        One AIAnswer per item, in order, or None if the request failed or the
+        batched response can't be split cleanly (ask each with ask_gemma instead).
+    """
+    if len(items) == 1:
+        return [ask_gemma(*items[0])]
+    
+    try:
+        response = _get_model().generate_content(_build_batch_prompt(items))
+        # Each top-level {...} in the array is one question's answer object
+        objects = [m.group(0) for m in _JSON_RE.finditer(response.text)]
+    except Exception:
+        return None
+    
+    if len(objects) != len(items):
+        return None
+    return [_parse_batch_item(obj, len(options)) for obj, (_, options) in zip(objects, items)]
+
+
+class GemmaBatcher:
+    """
+    Coalesces questions submitted within a short window into one Gemma request.
+    
+    Classes that see a new question at nearly the same moment share a single
+    model call instead of each paying for their own. Batches run on a small
+    thread pool, so one slow call never holds up the next question.
+    """
+    
+    def __init__(self, deadline_ms: int = 200, max_batch: int = 8, max_workers: int = 4):
+        self.deadline = deadline_ms / 1000
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemma")
+    
+    def submit(self, question: str, options: list[str]) -> Future:
+        """Queue a question; the returned Future resolves to its AIAnswer."""
+        future = Future()
+        self._queue.put((question, options, future))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="gemma-batcher", daemon=True)
+                self._thread.start()
+        return future
+    
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # A lone question goes out right away; the window only applies once others are waiting
+            if not self._queue.empty():
+                deadline = time.monotonic() + self.deadline
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+            
+            # Drop questions whose caller gave up (e.g. the poll moved on) while queued
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if batch:
+                self._executor.submit(self._answer_batch, batch)
+    
+    def _answer_batch(self, batch: list[tuple[str, list[str], Future]]) -> None:
+        if len(batch) > 1:
+            try:
+                answers = ask_gemma_batch([(question, options) for question, options, _ in batch])
+            except Exception as e:
+                # Waiting sessions see the failure instead of hanging
+                for _, _, future in batch:
+                    future.set_exception(e)
+                return
+            if answers is not None:
+                for (_, _, future), answer in zip(batch, answers):
+                    future.set_result(answer)
+                return
+            # The batch didn't split cleanly: ask the rest individually, in parallel
+            for item in batch[1:]:
+                self._executor.submit(self._answer_one, item)
+        self._answer_one(batch[0])
+    
+    def _answer_one(self, item: tuple[str, list[str], Future]) -> None:
+        question, options, future = item
+        try:
+            future.set_result(ask_gemma(question, options))
+        except Exception as e:
+            future.set_exception(e)
+
+
+_BATCHER = GemmaBatcher()
+
+# Confident answers by (question, options), so repeated questions skip Gemma entirely
+ANSWER_CACHE_SIZE = 512
+_ANSWER_CACHE: OrderedDict[tuple[str, tuple[str, ...]], AIAnswer] | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def _load_answer_cache() -> OrderedDict:
+    """Read the persisted cache on first use (missing or corrupt file: start empty)."""
+    global _ANSWER_CACHE
+    if _ANSWER_CACHE is None:
+        _ANSWER_CACHE = OrderedDict()
+        try:
+            for entry in loads(ANSWER_CACHE_FILE.read_bytes()):
+                answer = entry["answer"]
+                answer["status"] = AnswerStatus(answer["status"])
+                _ANSWER_CACHE[(entry["question"], tuple(entry["options"]))] = AIAnswer(**answer)
+        except (OSError, JSONDecodeError, KeyError, TypeError, ValueError):
+            pass
+    return _ANSWER_CACHE
+
+
+def _cache_answer(question: str, options: list[str], answer: AIAnswer) -> None:
+    """Remember an answer if it is confident enough to reuse without asking again."""
+    if answer.status != AnswerStatus.ANSWERED or answer.confidence not in ("high", "medium"):
+        return
+    with _CACHE_LOCK:
+        cache = _load_answer_cache()
+        cache[(question, tuple(options))] = answer
+        cache.move_to_end((question, tuple(options)))
+        while len(cache) > ANSWER_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def _save_answer_cache() -> None:
+    """Persist the cache on exit (only if it was used this run)."""
+    with _CACHE_LOCK:
+        if not _ANSWER_CACHE:
+            return
+        entries = [
+            {"question": q, "options": list(opts), "answer": {**asdict(a), "status": a.status.value}}
+            for (q, opts), a in _ANSWER_CACHE.items()
+        ]
+    try:
+        ANSWER_CACHE_FILE.write_bytes(dumps(entries))
+    except OSError as e:
+        print(f"⚠️  Could not save answer cache: {e}")
+
+
+atexit.register(_save_answer_cache)
+
+
+def submit_question(question: str, options: list[str]) -> Future:
+    """
+    Answer from the cache if this exact question was answered confidently before,
+    otherwise queue it on the shared batcher. Resolves to an AIAnswer.
+    """
+    key = (question, tuple(options))
+    with _CACHE_LOCK:
+        cache = _load_answer_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            cache.move_to_end(key)
+    
+    if cached is not None:
+        future = Future()
+        future.set_result(cached)
+        return future
+    
+    def remember(done: Future) -> None:
+        if not done.cancelled() and done.exception() is None:
+            _cache_answer(question, options, done.result())
+    
+    future = _BATCHER.submit(question, options)
+    future.add_done_callback(remember)
+    return future
+
+
 def notify_low_confidence(question: str, answer: AIAnswer) -> None:
     """Send Mac notification for low confidence or error answers."""
     if answer.status == AnswerStatus.LOW_CONFIDENCE:
@@ -5,11 +5,21 @@ iMessage integration for macOS.
 Functions to send and receive iMessages via AppleScript and SQLite.
 Includes handling for self-testing via -test flag.
 """
-import json
-import subprocess
-import time
+import asyncio
+import os
+import sqlite3
+import threading
 import sys
 from pathlib import Path
+from typing import Callable
+
+try:
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+from _json import loads
+from _osa import quote, run_osa
 
 # Path to config
 CONFIG_PATH = Path(__file__).parent.parent / "data" / "imessage_config.json"
@@ -17,11 +27,47 @@ CONFIG_PATH = Path(__file__).parent.parent / "data" / "imessage_config.json"
 # Global test flag
 TEST_MODE = "-test" in sys.argv
 
+DB_PATH = os.path.expanduser("~/Library/Messages/chat.db")
+MESSAGES_DIR = os.path.dirname(DB_PATH)
+
+# Handle rows the recipient may be stored under (resolved once per recipient).
+# NOCASE so email handles match however the recipient was capitalized.
+_HANDLE_QUERY = "SELECT ROWID FROM handle WHERE id COLLATE NOCASE IN ({placeholders})"
+
+# Most recent incoming message from one of the handles
+_LATEST_QUERY = """
+SELECT text, ROWID
+FROM message
+WHERE handle_id IN ({placeholders})
+  AND is_from_me = 0
+  AND text IS NOT NULL AND text <> ''
+ORDER BY ROWID DESC
+LIMIT 1
+"""
+
+# Oldest incoming message past a rowid watermark: a range seek on message.ROWID
+# that only visits rows newer than the last one seen
+_SINCE_QUERY = """
+SELECT text, ROWID
+FROM message
+WHERE ROWID > ?
+  AND handle_id IN ({placeholders})
+  AND is_from_me = 0
+  AND text IS NOT NULL AND text <> ''
+ORDER BY ROWID ASC
+LIMIT 1
+"""
+
+# Shared read-only connection to chat.db (used from several class threads)
+_CONN: sqlite3.Connection | None = None
+_DB_LOCK = threading.Lock()
+_HANDLE_IDS: dict[str, tuple[int, ...]] = {}
+
 def load_config() -> dict:
     """Load iMessage config from JSON file."""
     if not CONFIG_PATH.exists():
         raise FileNotFoundError(f"Config not found at {CONFIG_PATH}")
-    return json.loads(CONFIG_PATH.read_text())
+    return loads(CONFIG_PATH.read_bytes())
 
 
 def send_message(recipient: str, message: str) -> bool:
@@ -35,38 +81,196 @@ def send_message(recipient: str, message: str) -> bool:
     Returns:
         True if sent successfully, False otherwise
     """
-    # Escape quotes and backslashes in message
-    escaped_message = message.replace('\\', '\\\\').replace('"', '\\"')
-    
-    applescript = f'''
-    tell application "Messages"
-        set targetService to 1st account whose service type = iMessage
-        set targetBuddy to participant "{recipient}" of targetService
-        send "{escaped_message}" to targetBuddy
-    end tell
-    '''
+    # Both values go through quote() so neither can break out of its string literal
+    applescript = (
+        f'tell application "Messages" to send {quote(message)} '
+        f'to participant {quote(recipient)} of (1st account whose service type = iMessage)'
+    )
     
     try:
-        result = subprocess.run(
-            ["osascript", "-e", applescript],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            print(f"✅ Sent to {recipient}: {message[:50]}...")
-            return True
-        else:
-            print(f"❌ Failed to send: {result.stderr}")
-            return False
-    except subprocess.TimeoutExpired:
+        run_osa(applescript, timeout=10)
+        print(f"✅ Sent to {recipient}: {message[:50]}...")
+        return True
+    except TimeoutError:
         print("❌ Timeout sending message")
         return False
+    except RuntimeError as e:
+        print(f"❌ Failed to send: {e}")
+        return False
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
 
 
+# Messages writes new rows to the WAL first; the main file changes on checkpoint
+_DB_FILES = frozenset({"chat.db", "chat.db-wal"})
+
+
+class _ChangeHandler:
+    """Minimal watchdog handler: events on the Messages database files fire the callback."""
+    
+    def __init__(self, callback: Callable[[], None]):
+        self._callback = callback
+    
+    def dispatch(self, event) -> None:
+        paths = (event.src_path, getattr(event, "dest_path", ""))
+        if any(os.path.basename(path) in _DB_FILES for path in paths):
+            self._callback()
+
+
+# One observer per process, started on first use; each waiter registers a callback on it
+_OBSERVER = None
+_WATCHERS: set[Callable[[], None]] = set()
+_WATCH_LOCK = threading.Lock()
+
+
+def _notify_watchers() -> None:
+    with _WATCH_LOCK:
+        callbacks = tuple(_WATCHERS)
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            # One broken waiter must not kill the shared observer thread
+            print(f"⚠️  Messages watcher callback failed: {e}")
+
+
+def watch_messages(callback: Callable[[], None]) -> Callable[[], None] | None:
+    """
+    Call `callback` (from the watchdog thread) whenever the Messages database changes.
+    
+    Returns:
+        A function that unregisters the callback, or None if watchdog is not
+        installed or the Messages directory is missing -- callers should poll instead.
+    """
+    global _OBSERVER
+    if Observer is None or not os.path.isdir(MESSAGES_DIR):
+        return None
+    with _WATCH_LOCK:
+        if _OBSERVER is None:
+            observer = Observer()
+            observer.schedule(_ChangeHandler(_notify_watchers), MESSAGES_DIR, recursive=False)
+            observer.daemon = True
+            observer.start()
+            _OBSERVER = observer
+        _WATCHERS.add(callback)
+    
+    def unwatch() -> None:
+        with _WATCH_LOCK:
+            _WATCHERS.discard(callback)
+    return unwatch
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Open the read-only Messages database connection once and reuse it."""
+    global _CONN
+    if _CONN is None:
+        # mode=ro (not immutable=1): chat.db is in WAL mode and new messages
+        # live in the WAL until Messages checkpoints, so we must keep seeing it.
+        # Likewise no locking_mode=EXCLUSIVE, which could block Messages itself.
+        _CONN = sqlite3.connect(
+            f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False, isolation_level=None
+        )
+        _CONN.execute("PRAGMA query_only=1")
+        _CONN.execute("PRAGMA temp_store=MEMORY")
+        # Read pages through mmap and keep ~20 MB of them cached between polls
+        _CONN.execute("PRAGMA mmap_size=268435456")
+        _CONN.execute("PRAGMA cache_size=-20000")
+    return _CONN
+
+
+# Phone number punctuation, dropped in a single pass
+_PHONE_STRIP = str.maketrans("", "", " -()")
+
+
+def _handle_candidates(recipient: str) -> tuple[str, ...]:
+    """Exact handle.id spellings the recipient may be stored under."""
+    normalized = recipient.translate(_PHONE_STRIP)
+    candidates = {recipient, normalized}
+    
+    digits = normalized.lstrip("+")
+    if digits.isdigit():
+        # US numbers are stored as +1XXXXXXXXXX, but accept the bare forms too
+        if len(digits) == 11 and digits.startswith("1"):
+            digits = digits[1:]
+        if len(digits) == 10:
+            candidates.update({f"+1{digits}", f"1{digits}", digits})
+        else:
+            candidates.add(f"+{digits}")
+    
+    return tuple(sorted(candidates))
+
+
+def _execute(query: str, params: tuple) -> list[tuple] | None:
+    """Run a read query against chat.db; None if the database is missing."""
+    global _CONN
+    
+    if not os.path.exists(DB_PATH):
+        print("❌ Messages database not found")
+        return None
+    
+    try:
+        with _DB_LOCK:
+            # fetchall() steps the statement to completion so no read snapshot is held between polls
+            return _get_conn().execute(query, params).fetchall()
+    except Exception as e:
+        # Drop the cached connection so the next poll reconnects
+        with _DB_LOCK:
+            if _CONN is not None:
+                _CONN.close()
+                _CONN = None
+        raise Exception(f"Database error: {e}")
+
+
+def _resolve_handle_ids(recipient: str) -> tuple[int, ...]:
+    """
+    handle.ROWIDs for the recipient's spellings, cached once found.
+    
+    Empty results aren't cached: the handle row only appears after the first
+    message with that contact, which may arrive while we wait.
+    """
+    if recipient in _HANDLE_IDS:
+        return _HANDLE_IDS[recipient]
+    
+    candidates = _handle_candidates(recipient)
+    rows = _execute(_HANDLE_QUERY.format(placeholders=", ".join("?" * len(candidates))), candidates)
+    handle_ids = tuple(rowid for rowid, in rows or ())
+    if handle_ids:
+        _HANDLE_IDS[recipient] = handle_ids
+    return handle_ids
+
+
+def _query_message(query: str, recipient: str, *params) -> tuple[str, int] | None:
+    """Run a (text, rowid) message query for the recipient's handles; first row or None."""
+    handle_ids = _resolve_handle_ids(recipient)
+    if not handle_ids:
+        return None
+    
+    rows = _execute(query.format(placeholders=", ".join("?" * len(handle_ids))), (*params, *handle_ids))
+    if not rows:
+        return None
+    text, rowid = rows[0]
+    return (text, rowid)
+
+
+def _db_signature() -> tuple[tuple[int, int] | None, ...]:
+    """
+    (mtime_ns, size) of chat.db and its WAL, or None for a missing file.
+    
+    Any new row changes one of them, so an unchanged signature means a query
+    would find nothing new.
+    """
+    signature = []
+    for path in (DB_PATH, DB_PATH + "-wal"):
+        try:
+            st = os.stat(path)
+        except OSError:
+            signature.append(None)
+        else:
+            signature.append((st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
 def get_latest_message(recipient: str) -> tuple[str, int] | None:
     """
     Get the latest message received from a recipient by querying the Messages database.
@@ -79,102 +283,127 @@ def get_latest_message(recipient: str) -> tuple[str, int] | None:
         Tuple of (message_text, rowid) or None if not found.
         The rowid can be used to detect new messages.
     """
-    import sqlite3
-    import os
-    
-    # Normalize if it looks like a phone number
-    normalized = recipient.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
-    if normalized.startswith("+1"):
-        normalized = normalized[2:]
-    elif normalized.startswith("1") and len(normalized) == 11:
-        normalized = normalized[1:]
-    
-    db_path = os.path.expanduser("~/Library/Messages/chat.db")
+    return _query_message(_LATEST_QUERY, recipient)
+
+
+def get_messages_since(recipient: str, since_rowid: int) -> tuple[str, int] | None:
+    """
+    Get the oldest message received from a recipient after `since_rowid`.
     
-    if not os.path.exists(db_path):
-        print("❌ Messages database not found")
-        return None
+    Args:
+        recipient: Phone number or iCloud email address
+        since_rowid: Watermark, e.g. the rowid from get_latest_message
     
-    try:
-        # Connect in read-only mode
-        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
-        cursor = conn.cursor()
-        
-        # Query for messages from this recipient
-        # We look for the recipient in the handle table and join to messages
-        query = """
-        SELECT m.text, m.ROWID, m.is_from_me, m.date
-        FROM message m
-        JOIN chat_message_join cmj ON m.ROWID = cmj.message_id
-        JOIN chat c ON cmj.chat_id = c.ROWID
-        JOIN chat_handle_join chj ON c.ROWID = chj.chat_id
-        JOIN handle h ON chj.handle_id = h.ROWID
-        WHERE h.id LIKE ?
-        ORDER BY m.date DESC
-        LIMIT 10
-        """
-        
-        # Try different formats (normalized and original)
-        patterns = [
-            f"%{normalized}%",
-            f"%{recipient}%",
-        ]
-        
-        for pattern in patterns:
-            cursor.execute(query, (pattern,))
-            rows = cursor.fetchall()
-            
-            if rows:
-                # Find the most recent message NOT from me
-                for text, rowid, is_from_me, date in rows:
-                    if is_from_me == 0 and text:  # Message from them
-                        conn.close()
-                        return (text, rowid)
-                
-                # If all messages are from me, return None
-                conn.close()
-                return None
-        
-        conn.close()
-        return None
-        
-    except Exception as e:
-        # print(f"❌ Database error: {e}")
-        raise Exception(f"Database error: {e}")
+    Returns:
+        Tuple of (message_text, rowid) or None if nothing new arrived.
+        Passing the returned rowid back in walks new messages in order.
+    """
+    return _query_message(_SINCE_QUERY, recipient, since_rowid)
 
 
-def wait_for_reply(recipient: str, timeout_seconds: int = 6000, poll_interval: int = 2) -> str | None:
+async def wait_for_reply_async(recipient: str, timeout_seconds: int = 6000, poll_interval: float = 2,
+                               max_interval: float = 10, backoff_factor: float = 1.5,
+                               should_stop: Callable[[], bool] | None = None,
+                               since_rowid: int | None = None, quiet: bool = False,
+                               safety_interval: float = 30) -> tuple[str, int] | None:
     """
-    Wait for a new message from a recipient.
+    Wait for a new message from a recipient without blocking the event loop.
+    
+    When watchdog is available, chat.db is only queried after a write to it (plus
+    a safety-net query every safety_interval seconds in case an event is missed).
+    Otherwise polls with a delay that backs off while no reply arrives. Cancelling
+    the awaiting task stops the wait.
     
     Args:
         recipient: Phone number or iCloud email address
         timeout_seconds: How long to wait for a reply
-        poll_interval: How often to check for new messages
+        poll_interval: Initial delay between checks (and how often should_stop is re-checked)
+        max_interval: Upper bound the polling delay backs off to
+        backoff_factor: Multiplier applied to the polling delay after each empty check
+        safety_interval: With watchdog, the longest time between queries without an event
+        should_stop: Checked on every wake; returning True ends the wait early
+        since_rowid: Only messages newer than this rowid count (default: the latest one now)
+        quiet: Skip progress prints (for callers that log on their own)
     
     Returns:
-        The new message text, or None if timeout
+        Tuple of (message_text, rowid) for the new message, or None on timeout/stop
     """
-    print(f"⏳ Waiting for reply from {recipient} (timeout: {timeout_seconds}s)...")
+    if not quiet:
+        print(f"⏳ Waiting for reply from {recipient} (timeout: {timeout_seconds}s)...")
     
-    if TEST_MODE:
-        print("🕒 TEST MODE: Sleeping 5s before setting baseline (ignoring self-text echo)...")
-        time.sleep(5)
+    if since_rowid is None:
+        if TEST_MODE:
+            print("🕒 TEST MODE: Sleeping 5s before setting baseline (ignoring self-text echo)...")
+            await asyncio.sleep(5)
+        
+        # Get the current latest message rowid to compare against
+        initial = await asyncio.to_thread(get_latest_message, recipient)
+        since_rowid = initial[1] if initial else 0
     
-    # Get the current latest message rowid to compare against
-    initial = get_latest_message(recipient)
-    initial_rowid = initial[1] if initial else 0
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
     
-    start_time = time.time()
-    while time.time() - start_time < timeout_seconds:
-        current = get_latest_message(recipient)
-        
-        # Check if we got a new message (higher rowid = newer)
-        if current and current[1] > initial_rowid:
-            print(f"📩 Received: {current[0]}")
-            return current[0]
-        
-        time.sleep(poll_interval)
+    def on_change() -> None:
+        # Runs on the watchdog thread; the loop may close at any moment, so late events are dropped
+        try:
+            loop.call_soon_threadsafe(changed.set)
+        except RuntimeError:
+            pass
     
-    print("⏰ Timeout waiting for reply")
+    delay = poll_interval
+    deadline = loop.time() + timeout_seconds
+    next_safety_query = 0.0
+    last_signature = None
+    unwatch = None
+    try:
+        unwatch = watch_messages(on_change)
+        while (remaining := deadline - loop.time()) > 0:
+            if should_stop is not None and should_stop():
+                return None
+            
+            if unwatch is None or changed.is_set() or loop.time() >= next_safety_query:
+                # Clear before querying so a write landing mid-query still wakes the next wait
+                changed.clear()
+                next_safety_query = loop.time() + safety_interval
+                
+                # A stat() of the database files is enough to skip the query when nothing was written
+                signature = _db_signature()
+                if signature != last_signature:
+                    current = await asyncio.to_thread(get_messages_since, recipient, since_rowid)
+                    last_signature = signature  # only once the query went through
+                    
+                    # Any row at all is a new message (its rowid is past the watermark)
+                    if current:
+                        if not quiet:
+                            print(f"📩 Received: {current[0]}")
+                        return current
+            
+            if unwatch is None:
+                # Back off while idle: a long wait shouldn't query chat.db every 2s
+                wait = delay
+                delay = min(delay * backoff_factor, max_interval)
+            elif should_stop is not None:
+                wait = poll_interval  # short waits only so should_stop stays responsive
+            else:
+                wait = next_safety_query - loop.time()
+            
+            try:
+                await asyncio.wait_for(changed.wait(), min(wait, remaining))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if unwatch is not None:
+            unwatch()
+    
+    if not quiet:
+        print("⏰ Timeout waiting for reply")
     return None
+
+
+def wait_for_reply(recipient: str, timeout_seconds: int = 6000, **kwargs) -> tuple[str, int] | None:
+    """
+    Blocking wrapper around wait_for_reply_async for scripts without an event loop.
+    
+    Takes the same arguments and returns (message_text, rowid) or None on timeout/stop.
+    """
+    return asyncio.run(wait_for_reply_async(recipient, timeout_seconds, **kwargs))
@@ -2,30 +2,47 @@
 """
 PollEV Monitor Script - Multi-Class Concurrent Version.
 
-Runs indefinitely, opening multiple browser sessions for all active classes
-simultaneously. Each browser auto-closes when its class ends.
+Runs indefinitely on a single asyncio event loop, opening an isolated browser
+context (on one shared Chromium) for every active class simultaneously.
+Each context auto-closes when its class ends.
 """
+import asyncio
+import re
 import sys
-import time as time_module
 import threading
+import time as time_module
 from datetime import datetime
 from pathlib import Path
 
 # Add src to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 
 from config import POLLEV_BASE_URL
-from utils import load_classes, is_within_class_time, parse_time
-from gemma import ask_gemma, notify_low_confidence, AnswerStatus
+from utils import load_classes, build_schedule, build_active_index, active_classes_at, parse_time
+from gemma import submit_question, notify_low_confidence, AnswerStatus
+from imessage import load_config, send_message, get_latest_message, wait_for_reply_async
 import browser
+from browser_pool import BrowserPool
 
 # Global flag for graceful shutdown
 _stop_requested = False
-# Track which classes have active sessions
-_active_sessions = {}
-_sessions_lock = threading.Lock()
+# Set (from the input thread) to wake main() immediately on shutdown
+_stop_event: asyncio.Event | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+# Max time a session sleeps waiting for a DOM change before re-checking stop/end time
+CHANGE_WAIT_TIMEOUT_MS = 5000
+# Backoff bounds (seconds) for polling chat.db when no file watcher is available
+MIN_REPLY_POLL_DELAY = 1.0
+MAX_REPLY_POLL_DELAY = 10.0
+# A reply that is just an option number (surrounding whitespace allowed)
+_REPLY_RE = re.compile(r"\s*(\d+)\s*\Z")
+
+# Track which classes have active sessions (one task each, all on the main event loop)
+_active_sessions: dict[str, asyncio.Task] = {}
+# Each running session's DOM-change event, so shutdown can wake them too
+_session_wakeups: set[asyncio.Event] = set()
 
 
 def log(message: str, class_name: str = None) -> None:
@@ -35,33 +52,53 @@ def log(message: str, class_name: str = None) -> None:
     print(f"[{timestamp}] {prefix}{message}")
 
 
-def handle_poll_question(page, class_name: str) -> None:
-    """Extract question, ask Gemma, and click the best answer."""
-    result = browser.extract_from_page(page)
-    if not result:
-        return
+async def _wait_for_event(event: asyncio.Event, timeout: float = 2) -> None:
+    """Sleep until `event` is set or `timeout` passes (so other conditions are still re-checked)."""
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+_CONFIDENCE_EMOJI = {"high": "🟢", "medium": "🟡"}
+
+
+def _answer_log(outcome: str, answer) -> str:
+    """Log line for an answer outcome ("error" or the confidence level)."""
+    if outcome == "error":
+        return f"❌ AI Error: {answer.reasoning}"
+    if outcome == "low":
+        return f"🔴 Low Confidence: {answer.reasoning[:100]}..."
+    emoji = _CONFIDENCE_EMOJI.get(outcome, "⚪")
+    return f"{emoji} Gemma Response: Confidence={answer.confidence}, Suggested=Option {answer.option_number}"
+
+# Outcomes that notify and fall back to asking over iMessage
+_NEEDS_HELP = frozenset({"error", "low"})
+
+
+async def handle_poll_question(page, class_name: str, extracted: tuple[str, list[str]]) -> None:
+    """
+    Ask Gemma about the already-extracted (question, options) and click the best answer.
     
-    question, options = result
+    Runs as its own task (see monitor_page_changes), which is cancelled once the
+    question is replaced or closed.
+    """
+    question, options = extracted
     
     # Consolidated print as requested
     log(f"Asking Gemma: Options={options} Question='{question}'", class_name)
     
-    answer = ask_gemma(question, options)
+    # Coalesced with other classes' questions into one Gemma call, off the event loop
+    answer = await asyncio.wrap_future(submit_question(question, options))
     
-    selected_option_index = None
-
-    if answer.status == AnswerStatus.ERROR:
-        log(f"❌ AI Error: {answer.reasoning}", class_name)
-        notify_low_confidence(question, answer)
-    elif answer.confidence == "low":
-        log(f"🔴 Low Confidence: {answer.reasoning[:100]}...", class_name)
+    # Errors are keyed separately; otherwise the confidence level picks the log line
+    outcome = "error" if answer.status == AnswerStatus.ERROR else answer.confidence
+    log(_answer_log(outcome, answer), class_name)
+    
+    needs_help = outcome in _NEEDS_HELP
+    if needs_help:
         notify_low_confidence(question, answer)
-        selected_option_index = answer.option_number - 1
-    else:
-        # High/Medium confidence
-        confidence_emoji = {"high": "🟢", "medium": "🟡"}.get(answer.confidence, "⚪")
-        log(f"{confidence_emoji} Gemma Response: Confidence={answer.confidence}, Suggested=Option {answer.option_number}", class_name)
-        selected_option_index = answer.option_number - 1
+    selected_option_index = None if outcome == "error" else answer.option_number - 1
 
     # Legacy/Blocking iMessage block removed.
     # Flow should be: Ask Gemma -> Click Default -> Start Async Loop
@@ -70,15 +107,14 @@ def handle_poll_question(page, class_name: str) -> None:
     # Always click Gemma's answer first (even if Low Confidence) to ensure baseline participation
     if selected_option_index is not None:
         log(f"   Clicking initial AI choice: Option {selected_option_index + 1}...", class_name)
-        if browser.click_option(page, selected_option_index + 1):
+        if await browser.click_option(page, selected_option_index + 1):
              pass
         else:
              log(f"❌ Failed to click option {selected_option_index + 1}", class_name)
 
     # iMessage fallback loop (if needed)
-    if answer.confidence == "low" or answer.status == AnswerStatus.ERROR:
+    if needs_help:
         try:
-            from imessage import load_config, send_message, get_latest_message
             config = load_config()
             recipient = config.get("recipient_address")
             
@@ -89,66 +125,9 @@ def handle_poll_question(page, class_name: str) -> None:
                     msg_text += f"{i+1}. {opt}\n"
                 msg_text += f"Reply with 1-{len(options)}"
                 
-                if send_message(recipient, msg_text):
+                if await asyncio.to_thread(send_message, recipient, msg_text):
                     log(f"📱 Sent iMessage to {recipient}", class_name)
-                    
-                    # Enter loop to allow changing answer until question ends
-                    initial_hash = browser.get_page_content_hash(page)
-                    
-                    # Get baseline message ID to ignore old messages
-                    latest = get_latest_message(recipient)
-                    last_seen_rowid = latest[1] if latest else 0
-                    
-                    log(f"⏳ Waiting for replies from {recipient} (loops until next question)...", class_name)
-                    
-                    error_count = 0
-                    MAX_ERRORS = 3
-
-                    while not _stop_requested:
-                        # 1. Check if page changed (question ended)
-                        current_hash = browser.get_page_content_hash(page)
-                        if current_hash != initial_hash:
-                            log("🔄 Page content changed, stopping iMessage listener.", class_name)
-                            break
-                            
-                        # 2. Check for NEW messages
-                        try:
-                            current_msg = get_latest_message(recipient)
-                            # Reset error count on success
-                            error_count = 0
-                            
-                            if current_msg and current_msg[1] > last_seen_rowid:
-                                reply = current_msg[0]
-                                last_seen_rowid = current_msg[1]
-                                
-                                log(f"📩 Received: {reply}", class_name)
-                                
-                                if reply.strip().isdigit():
-                                    choice = int(reply.strip())
-                                    if 1 <= choice <= len(options):
-                                        log(f"📩 Friend replied: Option {choice}", class_name)
-                                        
-                                        # Always try to unclick previous before clicking new (no index check needed)
-                                        log(f"   Unclicking previous selection(s)...", class_name)
-                                        browser.unclick_current_option(page)
-                                        
-                                        # Click new
-                                        log(f"   Clicking option {choice}...", class_name)
-                                        if browser.click_option(page, choice):
-                                             log(f"✅ Changed answer to Option {choice}", class_name)
-                                             selected_option_index = choice - 1 # Update selected_option_index
-                                        else:
-                                             log(f"❌ Failed to click option {choice}", class_name)
-                                    else:
-                                        log(f"⚠️ Invalid choice: {choice}", class_name)
-                        except Exception as loop_e:
-                            error_count += 1
-                            log(f"⚠️ iMessage check failed ({error_count}/{MAX_ERRORS}): {loop_e}", class_name)
-                            if error_count >= MAX_ERRORS:
-                                log("🛑 iMessage listener stopped: Too many consecutive errors. Check permissions!", class_name)
-                                break
-                        
-                        time_module.sleep(2)
+                    await relay_replies(page, class_name, recipient, options)
             else:
                 log("⚠️ No iMessage recipient configured", class_name)
                 
@@ -157,172 +136,275 @@ def handle_poll_question(page, class_name: str) -> None:
             log("❌ Check for Full Disk Access permissions", class_name)
 
 
-def monitor_page_changes(page, class_name: str, class_info: dict) -> None:
-    """Poll for page changes and handle new questions."""
-    global _stop_requested
-    last_hash = browser.get_page_content_hash(page)
+async def relay_replies(page, class_name: str, recipient: str, options: list[str]) -> None:
+    """Click each numeric reply from the recipient until cancelled (the question changed)."""
+    # Get baseline message ID to ignore old messages
+    latest = await asyncio.to_thread(get_latest_message, recipient)
+    last_seen_rowid = latest[1] if latest else 0
+    
+    log(f"⏳ Waiting for replies from {recipient} (loops until next question)...", class_name)
+    
+    error_count = 0
+    MAX_ERRORS = 3
+    while not _stop_requested:
+        try:
+            current_msg = await wait_for_reply_async(
+                recipient,
+                poll_interval=MIN_REPLY_POLL_DELAY, max_interval=MAX_REPLY_POLL_DELAY,
+                should_stop=lambda: _stop_requested, since_rowid=last_seen_rowid, quiet=True,
+            )
+            # Reset error count on success
+            error_count = 0
+        except Exception as loop_e:
+            error_count += 1
+            log(f"⚠️ iMessage check failed ({error_count}/{MAX_ERRORS}): {loop_e}", class_name)
+            if error_count >= MAX_ERRORS:
+                log("🛑 iMessage listener stopped: Too many consecutive errors. Check permissions!", class_name)
+                break
+            await _wait_for_event(_stop_event, 2)
+            continue
+        
+        if current_msg is None:
+            break  # shutdown or timed out
+        reply, last_seen_rowid = current_msg
+        
+        log(f"📩 Received: {reply}", class_name)
+        
+        match = _REPLY_RE.match(reply)
+        if match:
+            choice = int(match.group(1))
+            if 1 <= choice <= len(options):
+                log(f"📩 Friend replied: Option {choice}", class_name)
+                
+                # Always try to unclick previous before clicking new (no index check needed)
+                log(f"   Unclicking previous selection(s)...", class_name)
+                await browser.unclick_current_option(page)
+                
+                # Click new
+                log(f"   Clicking option {choice}...", class_name)
+                if await browser.click_option(page, choice):
+                     log(f"✅ Changed answer to Option {choice}", class_name)
+                else:
+                     log(f"❌ Failed to click option {choice}", class_name)
+            else:
+                log(f"⚠️ Invalid choice: {choice}", class_name)
+
+
+async def monitor_page_changes(page, changed: asyncio.Event, class_name: str, class_info: dict) -> None:
+    """Wait for DOM mutations (pushed into `changed` by the page) and handle new questions."""
+    last_hash, result = await browser.snapshot(page)
     last_url = page.url
     last_question_handled = None
     end_time = parse_time(class_info.get("end_time", ""))
     
+    # Convert the wall-clock end time to a monotonic deadline once per session
+    end_deadline = None
+    if end_time is not None:
+        now = datetime.now()
+        end_deadline = time_module.monotonic() + (datetime.combine(now.date(), end_time) - now).total_seconds()
+    
+    # The current question's handler runs alongside this loop, so Gemma latency and
+    # the iMessage wait never stop the page from being watched
+    handler: asyncio.Task | None = None
+    
+    def stop_handler(reason: str | None = None) -> None:
+        if handler is not None and not handler.done():
+            if reason:
+                log(reason, class_name)
+            handler.cancel()
+    
+    def report_handler_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            log(f"❌ Question handler error: {task.exception()}", class_name)
+    
+    def start_handler(extracted: tuple[str, list[str]]) -> None:
+        nonlocal handler
+        stop_handler("🔄 Question changed, dropping the previous one.")
+        handler = asyncio.create_task(handle_poll_question(page, class_name, extracted))
+        handler.add_done_callback(report_handler_error)
+    
     # Try to answer initial question
-    result = browser.extract_from_page(page)
     if result:
-        handle_poll_question(page, class_name)
+        start_handler(result)
         last_question_handled = result[0]
     
-    while not _stop_requested:
-        # Check if class has ended
-        if end_time is not None:
-            now = datetime.now().time()
-            if now >= end_time:
+    # Close/crash arrive as events, so the loop checks a flag instead of catching errors
+    closed = asyncio.Event()
+    def on_closed(_) -> None:
+        closed.set()
+        changed.set()  # wake the wait below right away
+    
+    page.on("close", on_closed)
+    page.on("crash", on_closed)
+    _session_wakeups.add(changed)
+    
+    try:
+        while not _stop_requested and not closed.is_set():
+            # Check if class has ended
+            if end_deadline is not None and time_module.monotonic() >= end_deadline:
                 log(f"⏰ Class ended at {end_time}", class_name)
                 return
-        
-        time_module.sleep(0.5)
-        
-        try:
+            
+            # Sleep until the DOM mutates; wake periodically for stop/end-time checks
+            if not await browser.wait_for_change(changed, CHANGE_WAIT_TIMEOUT_MS) or _stop_requested:
+                continue
+            
+            # page.url is tracked client-side by Playwright (no round-trip)
             current_url = page.url
             if current_url != last_url:
                 # log(f"🔄 URL changed", class_name)
+                # Forget the old fingerprint so the snapshot below picks up a
+                # question already showing on the new page
                 last_url = current_url
-                last_hash = browser.get_page_content_hash(page)
+                last_hash = None
                 last_question_handled = None
-                continue
             
-            current_hash = browser.get_page_content_hash(page)
+            # Fingerprint and (only on change) extraction in one round-trip
+            current_hash, result = await browser.snapshot(page, last_hash)
             if current_hash != last_hash and current_hash:
                 # log(f"📝 Page content updated", class_name)
                 last_hash = current_hash
                 
-                result = browser.extract_from_page(page)
                 if result:
                     if result[0] != last_question_handled:
-                        handle_poll_question(page, class_name)
+                        start_handler(result)
                         last_question_handled = result[0]
                 else:
                     # Question disappeared (poll closed/changed), reset state
+                    stop_handler("🔄 Question closed, stopping its handler.")
                     last_question_handled = None
-                    
-        except Exception as e:
-            log(f"⚠️  Page state change: {type(e).__name__}", class_name)
-            break
+    finally:
+        _session_wakeups.discard(changed)
+        stop_handler()
+    
+    if closed.is_set():
+        log("⚠️  Page closed", class_name)
 
 
-def run_class_session(class_name: str, class_info: dict) -> None:
-    """Run a single class session in its own thread with its own Playwright instance."""
-    global _stop_requested, _active_sessions
-    
+async def run_class_session(pool: BrowserPool, class_name: str, class_info: dict) -> None:
+    """Run a single class session in its own context from the shared browser pool."""
     section = class_info["section"]
     url = f"{POLLEV_BASE_URL}/{section}"
     
     log(f"🎓 Starting session (Section: {section})", class_name)
     
     try:
-        with sync_playwright() as playwright:
-            driver, context = browser.create_geolocation_context(playwright, class_info)
-            page = context.new_page()
+        # A context is isolated (cookies, geolocation) but shares a pooled browser process
+        async with pool.acquire(**browser.geolocation_context_kwargs(class_info)) as context:
+            page = await context.new_page()
+            changed = await browser.install_page_helpers(page)
+            await page.goto(url)
+            # log(f"📍 Opened with spoofed location", class_name)
             
-            try:
-                page.goto(url)
-                # log(f"📍 Opened with spoofed location", class_name)
-                
-                monitor_page_changes(page, class_name, class_info)
-                
-            finally:
-                context.close()
-                driver.close()
+            await monitor_page_changes(page, changed, class_name, class_info)
                 
     except Exception as e:
         log(f"❌ Session error: {e}", class_name)
     
     finally:
-        with _sessions_lock:
-            _active_sessions.pop(class_name, None)
+        _active_sessions.pop(class_name, None)
         log(f"👋 Session closed", class_name)
 
 
-def start_class_session(class_name: str, class_info: dict) -> None:
-    """Start a class session in a new thread if not already running."""
-    global _active_sessions
+def start_class_session(pool: BrowserPool, class_name: str, class_info: dict) -> None:
+    """Start a class session as a new task if not already running."""
+    if class_name in _active_sessions:
+        return  # Already running
     
-    with _sessions_lock:
-        if class_name in _active_sessions:
-            return  # Already running
-        
-        thread = threading.Thread(
-            target=run_class_session,
-            args=(class_name, class_info),
-            daemon=True
-        )
-        _active_sessions[class_name] = thread
-        thread.start()
+    _active_sessions[class_name] = asyncio.create_task(
+        run_class_session(pool, class_name, class_info)
+    )
 
 
-def get_all_active_classes(classes: dict) -> list[tuple[str, dict]]:
+def get_all_active_classes(active_index: list[tuple[int, int, str, dict]]) -> list[tuple[str, dict]]:
     """Get all classes that are currently within their scheduled time."""
-    active = []
-    for class_name, class_info in classes.items():
-        if is_within_class_time(class_info):
-            active.append((class_name, class_info))
-    return active
+    return active_classes_at(active_index, datetime.now().time())
 
 
-def main():
+async def main():
     """Main loop: continuously check for active classes and spawn sessions."""
-    global _stop_requested
-    
     log("=" * 60)
     log("PollEV Multi-Class Monitor Started")
     log("=" * 60)
     log("💡 Type 'exit' and press ENTER to stop all sessions gracefully")
     
+    global _stop_event, _loop
+    _stop_event = asyncio.Event()
+    _loop = asyncio.get_running_loop()
+    
     classes = load_classes()
     log(f"Loaded {len(classes)} class(es): {', '.join(classes.keys())}")
+    active_index = build_active_index(build_schedule(classes))
     
-    while not _stop_requested:
-        # Get all currently active classes
-        active_classes = get_all_active_classes(classes)
+    # One Playwright driver and a browser pool shared by every class (launched on first acquire)
+    async with async_playwright() as playwright:
+        pool = BrowserPool(playwright)
         
-        # Start sessions for any active classes that aren't already running
-        for class_name, class_info in active_classes:
-            start_class_session(class_name, class_info)
+        while not _stop_requested:
+            # Get all currently active classes
+            active_classes = get_all_active_classes(active_index)
+            
+            # Start sessions for any active classes that aren't already running
+            for class_name, class_info in active_classes:
+                start_class_session(pool, class_name, class_info)
+            
+            # Log status periodically is removed to reduce chatter
+            # just waiting...
+            
+            await _wait_for_event(_stop_event, 10)  # Check every 10 seconds
         
-        # Log status periodically is removed to reduce chatter
-        # just waiting...
+        # Wait for all sessions to close
+        log("🛑 Shutdown requested, waiting for sessions to close...")
+        tasks = list(_active_sessions.values())
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=5)
+            # Never tear the browsers down under a live session
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
         
-        time_module.sleep(10)  # Check every 10 seconds
-    
-    # Wait for all sessions to close
-    log("🛑 Shutdown requested, waiting for sessions to close...")
-    with _sessions_lock:
-        threads = list(_active_sessions.values())
-    
-    for t in threads:
-        t.join(timeout=5)
+        await pool.close()
     
     log("👋 All sessions closed. Exiting...")
 
 
-if __name__ == "__main__":
-    def input_listener():
-        """Listen for 'exit' command to trigger graceful shutdown."""
-        global _stop_requested
-        print("   (Type 'exit' and press Enter to stop)")
-        try:
-            while not _stop_requested:
-                cmd = input()
-                if cmd.strip().lower() in ["exit", "quit", "stop"]:
-                    _stop_requested = True
-                    break
-        except EOFError:
-            pass
+def _wake_all() -> None:
+    """Wake main() and every session wait so they all see the stop flag now."""
+    _stop_event.set()
+    for changed in _session_wakeups:
+        changed.set()
+
+
+def request_stop() -> None:
+    """Flag shutdown and wake main() and the sessions without waiting out their sleeps (thread-safe)."""
+    global _stop_requested
+    _stop_requested = True
+    if _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wake_all)
+
+
+def input_listener() -> None:
+    """Listen for 'exit' command to trigger graceful shutdown."""
+    print("   (Type 'exit' and press Enter to stop)")
+    try:
+        while not _stop_requested:
+            cmd = input()
+            if cmd.strip().lower() in ["exit", "quit", "stop"]:
+                request_stop()
+                break
+    except EOFError:
+        pass
+
+
+def run() -> None:
+    """Entry point: start the exit listener and run the monitor until stopped."""
+    global _stop_requested
     
     listener = threading.Thread(target=input_listener, daemon=True)
     listener.start()
     
     try:
-        main()
+        asyncio.run(main())
     except KeyboardInterrupt:
         _stop_requested = True
         print("\n")
@@ -331,3 +413,7 @@ if __name__ == "__main__":
         print(f"\n❌ Error: {e}")
         print("   Run 'python src/login.py' first to save your session.")
         sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
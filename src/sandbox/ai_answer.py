@@ -4,13 +4,14 @@ PollEV AI Answerer using Gemma 3 27B.
 
 Extracts question and options from PollEV HTML and uses AI to determine the best answer.
 """
+import gzip
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from bs4 import BeautifulSoup
 import google.generativeai as genai
+from selectolax.parser import HTMLParser
 from config import DATA_DIR
 
 
@@ -20,21 +21,25 @@ def extract_question_and_options(html_path: Path) -> tuple[str, list[str]] | Non
         print(f"❌ HTML file not found: {html_path}")
         return None
     
-    soup = BeautifulSoup(html_path.read_text(), "lxml")
+    if html_path.suffix == ".gz":
+        with gzip.open(html_path, "rt", encoding="utf-8") as f:
+            tree = HTMLParser(f.read())
+    else:
+        tree = HTMLParser(html_path.read_text())
     
     # Extract question title
-    title_elem = soup.select_one(".component-response-header__title")
-    if not title_elem:
+    title_elem = tree.css_first(".component-response-header__title")
+    if title_elem is None:
         print("❌ Could not find question title in HTML")
         return None
-    question = title_elem.get_text(strip=True)
+    question = title_elem.text(strip=True)
     
     # Extract options
-    option_elems = soup.select(".component-response-multiple-choice__option__value")
+    option_elems = tree.css(".component-response-multiple-choice__option__value")
     if not option_elems:
         print("❌ Could not find options in HTML")
         return None
-    options = [opt.get_text(strip=True) for opt in option_elems]
+    options = [opt.text(strip=True) for opt in option_elems]
     
     return question, options
 
@@ -81,7 +86,10 @@ def ask_gemma(prompt: str) -> str:
 
 
 def main():
-    html_path = DATA_DIR / "pollev_page.html"
+    # Prefer a fresh compressed capture from capture_pollev.py, else the plain sample
+    html_path = DATA_DIR / "pollev_page.html.gz"
+    if not html_path.exists():
+        html_path = DATA_DIR / "pollev_page.html"
     
     print("=" * 60)
     print("PollEV AI Answerer (Gemma 3 27B)")
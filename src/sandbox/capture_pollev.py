@@ -3,6 +3,7 @@
 Capture PollEV page HTML for analysis.
 Opens PollEV using saved session and saves the page HTML to data/.
 """
+import gzip
 import sys
 from pathlib import Path
 from datetime import datetime
@@ -17,7 +18,7 @@ from utils import load_classes
 def main():
     classes = load_classes()
     if not classes:
-        print("❌ No classes found in classes.json")
+        print("❌ No classes found in classes.jsonl")
         sys.exit(1)
     
     # Get first class
@@ -41,10 +42,10 @@ def main():
         print("⏳ Waiting for page to load (5 seconds)...")
         page.wait_for_timeout(5000)
         
-        # Save HTML
-        html_content = page.content()
-        output_file = DATA_DIR / "pollev_page.html"
-        output_file.write_text(html_content)
+        # Save HTML, compressed straight to disk (no second in-memory copy)
+        output_file = DATA_DIR / "pollev_page.html.gz"
+        with gzip.open(output_file, "wt", encoding="utf-8", compresslevel=6) as f:
+            f.write(page.content())
         
         file_size = output_file.stat().st_size
         file_size_kb = file_size / 1024
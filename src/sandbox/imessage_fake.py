@@ -2,6 +2,7 @@
 iMessage integration module.
 Currently uses MOCK implementations for testing integration.
 """
+import os
 import time
 import json
 import builtins
@@ -29,10 +30,13 @@ def send_message(recipient: str, message: str) -> bool:
 def wait_for_reply(recipient: str, timeout_seconds: int = 120) -> str | None:
     """
     Mock wait for reply.
-    Asks user for input via console.
+    Asks user for input via console, unless IMESSAGE_FAKE_REPLY is set
+    (then that reply is returned immediately, for unattended runs).
     """
     print(f"\n[MOCK WAIT] Waiting for reply from {recipient}...")
-    time.sleep(1)
+    fake_reply = os.environ.get("IMESSAGE_FAKE_REPLY")
+    if fake_reply is not None:
+        return fake_reply.strip()
     try:
         reply = input(f"[MOCK INPUT] Enter reply from {recipient}: ")
         return reply.strip()
@@ -6,14 +6,22 @@ Standalone script to send and receive iMessages via AppleScript.
 NOT integrated with the monitor yet - for testing only.
 """
 import json
-import subprocess
+import sys
 import time
 from pathlib import Path
 
+# Add src to path
+SRC_DIR = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(SRC_DIR))
+
+from _osa import quote, run_osa
 
 # Path to config
 CONFIG_PATH = Path(__file__).parent.parent.parent / "data" / "imessage_config.json"
 
+# Characters stripped when normalizing phone numbers
+_PHONE_STRIP = str.maketrans("", "", " -()")
+
 
 def load_config() -> dict:
     """Load iMessage config from JSON file."""
@@ -33,33 +41,23 @@ def send_imessage(recipient: str, message: str) -> bool:
     Returns:
         True if sent successfully, False otherwise
     """
-    # Escape quotes and backslashes in message
-    escaped_message = message.replace('\\', '\\\\').replace('"', '\\"')
-    
-    applescript = f'''
-    tell application "Messages"
-        set targetService to 1st account whose service type = iMessage
-        set targetBuddy to participant "{recipient}" of targetService
-        send "{escaped_message}" to targetBuddy
-    end tell
-    '''
+    # One-line statement for the shared osascript interpreter, so back-to-back
+    # sends reuse one process instead of spawning osascript each time
+    applescript = (
+        f'tell application "Messages" to send {quote(message)} '
+        f'to participant {quote(recipient)} of (1st account whose service type = iMessage)'
+    )
     
     try:
-        result = subprocess.run(
-            ["osascript", "-e", applescript],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            print(f"✅ Sent to {recipient}: {message[:50]}...")
-            return True
-        else:
-            print(f"❌ Failed to send: {result.stderr}")
-            return False
-    except subprocess.TimeoutExpired:
+        run_osa(applescript, timeout=10)
+        print(f"✅ Sent to {recipient}: {message[:50]}...")
+        return True
+    except TimeoutError:
         print("❌ Timeout sending message")
         return False
+    except RuntimeError as e:
+        print(f"❌ Failed to send: {e}")
+        return False
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
@@ -81,7 +79,7 @@ def get_latest_message(recipient: str) -> tuple[str, int] | None:
     import os
     
     # Normalize if it looks like a phone number
-    normalized = recipient.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
+    normalized = recipient.translate(_PHONE_STRIP)
     if normalized.startswith("+1"):
         normalized = normalized[2:]
     elif normalized.startswith("1") and len(normalized) == 11:
@@ -147,20 +145,6 @@ def get_latest_message_text(recipient: str) -> str | None:
     return result[0] if result else None
 
 
-def wait_for_reply(recipient: str, timeout_seconds: int = 60, poll_interval: int = 2) -> str | None:
-    """
-    Wait for a new message from a recipient.
-    
-    Args:
-        recipient: Phone number or iCloud email address
-        timeout_seconds: How long to wait for a reply
-        poll_interval: How often to check for new messages
-    
-    Returns:
-        The new message text, or None if timeout
-    """
-    print(f"⏳ Waiting for reply from {recipient} (timeout: {timeout_seconds}s)...")
-    
 def wait_for_reply(recipient: str, timeout_seconds: int = 60, poll_interval: int = 2) -> str | None:
     """
     Wait for a new message from a recipient.
@@ -6,7 +6,8 @@ Helps debugging "unclick" logic.
 import sys
 import time
 from pathlib import Path
-from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+from lxml.cssselect import CSSSelector
 
 # Add src to path
 SRC_DIR = Path(__file__).parent.parent.resolve()
@@ -20,6 +21,11 @@ from config import POLLEV_BASE_URL
 TEST_CLASS = "test0"  # Default test class
 OUTPUT_FILE = Path(__file__).parent.parent.parent / "data" / "click_investigation.html"
 
+# Compiled to XPath once; matching runs inside libxml2
+_CONTAINER_SEL = CSSSelector(".component-response-multiple-choice")
+# page.content() is re-encoded to UTF-8 once; tell libxml2 so it doesn't sniff
+_UTF8_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+
 def main():
     print("🔍 Click Investigation Sandbox")
     print("================================")
@@ -28,7 +34,7 @@ def main():
     class_info = classes.get(TEST_CLASS)
     
     if not class_info:
-        print(f"❌ Class '{TEST_CLASS}' not found in classes.json")
+        print(f"❌ Class '{TEST_CLASS}' not found in classes.jsonl")
         return
 
     url = f"{POLLEV_BASE_URL}/{class_info['section']}"
@@ -36,8 +42,10 @@ def main():
     
     with sync_playwright() as p:
         print("🚀 Launching browser...")
-        driver, context = browser.create_geolocation_context(p, class_info)
+        driver = p.chromium.launch(headless=False)
+        context = driver.new_context(**browser.geolocation_context_kwargs(class_info))
         page = context.new_page()
+        content = None
         
         try:
             page.goto(url)
@@ -58,19 +66,22 @@ def main():
                 time.sleep(2)  # Wait for UI update/animation
             
             print("📸 Capturing page state...")
-            content = page.content()
-            soup = BeautifulSoup(content, "lxml")
+            content = page.content().encode("utf-8")
+            tree = lxml_html.document_fromstring(content, parser=_UTF8_PARSER)
             
             # Extract relevant part to keep file small
             # Try to find the multiple choice component container
-            container = soup.select_one(".component-response-multiple-choice")
-            if not container:
+            matches = _CONTAINER_SEL(tree)
+            if matches:
+                container = matches[0]
+            else:
                 print("⚠️  Could not narrow down to .component-response-multiple-choice. Saving body.")
-                container = soup.body
+                container = tree.body
             
-            cleaned_html = container.prettify()
+            # Raw markup: no pretty-print pass over the subtree
+            cleaned_html = lxml_html.tostring(container, encoding="utf-8")
             
-            OUTPUT_FILE.write_text(cleaned_html)
+            OUTPUT_FILE.write_bytes(cleaned_html)
             print(f"\n💾 Saved DOM snapshot to: {OUTPUT_FILE}")
             print(f"   Size: {len(cleaned_html)} bytes")
             
@@ -79,9 +90,15 @@ def main():
         except Exception as e:
             print(f"❌ Error: {e}")
         finally:
+            # Backup: reuse the captured DOM; only serialize again if we failed before capturing
+            if content is None:
+                try:
+                    content = page.content().encode("utf-8")
+                except Exception:
+                    content = b""
+            with open("temp_dump.html", "wb") as f:
+                f.write(content)
             context.close()
-            with open("temp_dump.html", "w") as f: # Backup
-                f.write(page.content())
             driver.close()
 
 if __name__ == "__main__":
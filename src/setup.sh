@@ -16,7 +16,7 @@ source .venv/bin/activate
 # Install dependencies
 echo "   Installing Python packages..."
 # pip install --upgrade pip
-pip install playwright google-generativeai beautifulsoup4 lxml
+pip install playwright google-generativeai lxml cssselect selectolax orjson regex watchdog
 
 # Install Playwright browsers (chromium only)
 echo "   Installing Playwright Chromium..."
@@ -1,25 +1,102 @@
 """Utility functions for PollEV automation."""
-import json
+import re
+from bisect import bisect_right
+from copy import deepcopy
 from datetime import datetime, time
+from functools import lru_cache
 from typing import Any
 
-from config import CLASSES_FILE
+from _json import dumps, loads
+from config import CLASSES_FILE, LEGACY_CLASSES_FILE
+
+
+def _read_class_lines() -> tuple[dict[str, Any], int, int]:
+    """Replay classes.jsonl (one {name: info} object per line, last write wins).
+    Parsed once per file version; callers get their own deep copy of the dict.
+    Returns (classes, line_count, bad_line_count)."""
+    try:
+        stat = CLASSES_FILE.stat()
+    except FileNotFoundError:
+        return {}, 0, 0  # Fresh install: no classes saved yet
+    classes, count, bad = _parse_class_lines(stat.st_mtime_ns, stat.st_size)
+    return deepcopy(classes), count, bad
+
+
+@lru_cache(maxsize=1)
+def _parse_class_lines(mtime_ns: int, size: int) -> tuple[dict[str, Any], int, int]:
+    """Parse classes.jsonl; the (mtime, size) arguments only key the cache.
+    Torn or corrupt lines (e.g. from a crash mid-append) are skipped and counted."""
+    classes = {}
+    count = bad = 0
+    for lineno, line in enumerate(CLASSES_FILE.read_bytes().splitlines(), 1):
+        if not line.strip():
+            continue
+        count += 1
+        try:
+            entry = loads(line)
+            if not isinstance(entry, dict):
+                raise ValueError("not a {name: info} object")
+        except ValueError as e:
+            print(f"⚠️  Skipping bad line {lineno} in {CLASSES_FILE.name}: {e}")
+            bad += 1
+            continue
+        classes.update(entry)
+    return classes, count, bad
+
+
+def _write_classes(classes: dict[str, Any]) -> None:
+    """Rewrite classes.jsonl with exactly one line per class."""
+    tmp_path = CLASSES_FILE.with_suffix(".tmp")
+    tmp_path.write_bytes(b"".join(dumps({name: info}) + b"\n" for name, info in classes.items()))
+    tmp_path.replace(CLASSES_FILE)
 
 
 def load_classes() -> dict[str, Any]:
-    """Load class definitions from JSON file."""
-    with open(CLASSES_FILE, "r") as f:
-        return json.load(f)
+    """Load class definitions from the JSON Lines file."""
+    if not CLASSES_FILE.exists() and LEGACY_CLASSES_FILE.exists():
+        # One-time migration from the old single-object classes.json
+        _write_classes(loads(LEGACY_CLASSES_FILE.read_bytes()))
+    return _read_class_lines()[0]
+
+
+def save_classes(updates: dict[str, Any]) -> None:
+    """Append updated class definitions, compacting once stale lines dominate."""
+    if not updates:
+        return
+    load_classes()  # ensure any legacy file is migrated before appending
+    with open(CLASSES_FILE, "a+b") as f:
+        # Start on a fresh line if a crash left the last append torn
+        end = f.seek(0, 2)
+        if end:
+            f.seek(end - 1)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        f.write(b"".join(dumps({name: info}) + b"\n" for name, info in updates.items()))
+    
+    classes, count, bad = _read_class_lines()
+    # Compaction also drops any corrupt lines that were skipped on load
+    if bad or count > 2 * len(classes):
+        _write_classes(classes)
+
+
+# Exactly HH:MM:SS, ASCII digits only
+_TIME_RE = re.compile(r"([0-9]{2}):([0-9]{2}):([0-9]{2})")
 
 
+@lru_cache(maxsize=256)
 def parse_time(time_str: str) -> time | None:
-    """Parse HH:MM:SS string to time object. Returns None if invalid."""
+    """Parse HH:MM:SS string to time object. Returns None if invalid (results are memoized)."""
     if not time_str:
         return None
-    try:
-        return datetime.strptime(time_str, "%H:%M:%S").time()
-    except (ValueError, TypeError):
+    # A precompiled strict match plus int() instead of strptime, which re-interprets its
+    # format string every call; padded, signed or short fields (" 10:00:00", "1:2:3") are invalid
+    match = _TIME_RE.fullmatch(time_str) if isinstance(time_str, str) else None
+    if match is None:
         return None
+    try:
+        return time(*map(int, match.groups()))
+    except ValueError:
+        return None  # out of range, e.g. 25:00:00
 
 
 def is_within_class_time(class_info: dict[str, Any], now: datetime | None = None) -> bool:
@@ -29,51 +106,73 @@ def is_within_class_time(class_info: dict[str, Any], now: datetime | None = None
         now = datetime.now()
     
     start = parse_time(class_info.get("start_time", ""))
-    end = parse_time(class_info.get("end_time", ""))
-    current = now.time()
-    
-    # If start_time is invalid, class is always "active"
     if start is None:
         return True
-    
-    # If end_time is invalid, only check start
-    if end is None:
-        return current >= start
-    
-    return start <= current <= end
+    end = parse_time(class_info.get("end_time", ""))
+    current = now.time()
+    return start <= current and (end is None or current <= end)
+
+
+def build_schedule(classes: dict[str, Any]) -> list[tuple[str, dict, time | None, time | None]]:
+    """Parse every class's start/end time once: [(name, info, start, end), ...]."""
+    return [
+        (name, info, parse_time(info.get("start_time", "")), parse_time(info.get("end_time", "")))
+        for name, info in classes.items()
+    ]
+
+
+# End of day, for classes whose end time is missing or invalid
+_DAY_SECONDS = 24 * 3600
+
+
+def _seconds(t: time) -> int:
+    """Seconds since midnight, so hot-path comparisons are plain ints."""
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def build_active_index(schedule: list[tuple[str, dict, time | None, time | None]]) -> list[tuple[int, int, str, dict]]:
+    """Sort the schedule by start for active_classes_at: [(start_secs, end_secs, name, info), ...].
+    Classes without a valid start time sort first and never end (always active)."""
+    return sorted(
+        ((_seconds(start), _seconds(end) if end is not None else _DAY_SECONDS, name, info)
+         if start is not None else (0, _DAY_SECONDS, name, info)
+         for name, info, start, end in schedule),
+        key=lambda entry: entry[0],
+    )
+
+
+def active_classes_at(index: list[tuple[int, int, str, dict]], current: time) -> list[tuple[str, dict]]:
+    """Return every class whose window contains `current`, given an index from build_active_index.
+    A binary search skips classes that haven't started; only the rest have their end time checked."""
+    now = _seconds(current)
+    started = bisect_right(index, now, key=lambda entry: entry[0])
+    return [(name, info) for _, end, name, info in index[:started] if now <= end]
 
 
 def get_active_class(classes: dict[str, Any], now: datetime | None = None) -> tuple[str, dict] | None:
-    """Return the first class that is currently active, or None."""
+    """Return the first currently active class in start order (always-active classes first), or None.
+    One-off convenience over build_active_index/active_classes_at; loops should keep the index."""
     if now is None:
         now = datetime.now()
     
-    for name, info in classes.items():
-        if is_within_class_time(info, now):
-            return (name, info)
-    return None
+    active = active_classes_at(build_active_index(build_schedule(classes)), now.time())
+    return active[0] if active else None
+
 
+def build_start_index(schedule: list[tuple[str, dict, time | None, time | None]]) -> list[tuple[time, str]]:
+    """Sort classes with a valid start time by start: [(start, name), ...] for time_until_next_class."""
+    return sorted((start, name) for name, _, start, _ in schedule if start is not None)
 
-def time_until_next_class(classes: dict[str, Any], now: datetime | None = None) -> tuple[str, float] | None:
-    """Return (class_name, seconds_until_start) for the next upcoming class today."""
+
+def time_until_next_class(starts: list[tuple[time, str]], now: datetime | None = None) -> tuple[str, float] | None:
+    """Return (class_name, seconds_until_start) for the next upcoming class today.
+    `starts` comes from build_start_index, so the lookup is a binary search."""
     if now is None:
         now = datetime.now()
     
-    current = now.time()
-    best = None
-    best_delta = None
-    
-    for name, info in classes.items():
-        start = parse_time(info["start_time"])
-        if start > current:
-            # Calculate seconds until start
-            today = now.date()
-            start_dt = datetime.combine(today, start)
-            delta = (start_dt - now).total_seconds()
-            if best_delta is None or delta < best_delta:
-                best = name
-                best_delta = delta
+    idx = bisect_right(starts, now.time(), key=lambda entry: entry[0])
+    if idx == len(starts):
+        return None
     
-    if best is not None:
-        return (best, best_delta)
-    return None
+    start, name = starts[idx]
+    return (name, (datetime.combine(now.date(), start) - now).total_seconds())